@@ -1,46 +1,108 @@
 """FastAPI entry point for Claude Agent SDK service.
 
-This file is at the root for Render deployment convention.
-Start command: uvicorn main:app --host 0.0.0.0 --port $PORT
+This file is at the root for Render deployment convention. The agent
+package lives in src/; install it with `pip install -e .` (the Docker
+image puts src/ on PYTHONPATH instead).
+Start command: uvicorn main:app --host 0.0.0.0 --port $PORT --workers ${WEB_CONCURRENCY:-1} --loop uvloop --http httptools
 """
 
+import asyncio
 import logging
 import os
+import shutil
+import subprocess
 import sys
+from contextlib import aclosing, asynccontextmanager
 
+import orjson
+import uvicorn
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-
-# Add src to path for imports
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
-
-# Debug: Log env vars at startup
-print(f"DEBUG: ANTHROPIC_API_KEY present: {'ANTHROPIC_API_KEY' in os.environ}")
-print(f"DEBUG: ANTHROPIC_API_KEY length: {len(os.environ.get('ANTHROPIC_API_KEY', ''))}")
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 from agent.client import AgentClient
 from agent.config import get_settings
 
-# Configure logging
+# Configure logging; per-request logs are DEBUG, set LOG_LEVEL=DEBUG to see them
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
+
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that always closes its body generator.
+
+    Under ASGI 2.3 servers such as uvicorn, Starlette notices a disconnect
+    through receive() and cancels the streaming task, which unwinds the
+    body generator there. Under ASGI 2.4 it only sees the failed send()
+    and abandons the body iterator, which would leave the agent session
+    behind it to the garbage collector. This override covers the 2.4 path
+    by closing the body in the request task.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+
+def _probe_cli() -> dict:
+    """Check CLI availability for /debug/env."""
+    # Check if claude CLI is available
+    claude_path = shutil.which("claude")
+    node_path = shutil.which("node")
+    npm_path = shutil.which("npm")
+
+    # Try to get claude version
+    claude_version = None
+    try:
+        result = subprocess.run(["claude", "--version"], capture_output=True, text=True, timeout=10)
+        claude_version = result.stdout.strip() if result.returncode == 0 else f"error: {result.stderr}"
+    except Exception as e:
+        claude_version = f"exception: {str(e)}"
+
+    return {
+        "claude_path": claude_path,
+        "claude_version": claude_version,
+        "node_path": node_path,
+        "npm_path": npm_path,
+    }
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up process-wide state once per worker.
+
+    Each uvicorn worker is its own process, so the shared client, caches
+    and semaphore below are per worker.
+    """
+    app.state.default_client = AgentClient()
+    # The CLI install cannot change while the worker runs, so probe it once
+    app.state.debug_env_cache = await asyncio.to_thread(_probe_cli)
+    app.state.batch_semaphore = asyncio.Semaphore(get_settings().batch_concurrency)
+    yield
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Claude Agent SDK Service",
     description="Generic Claude Agent powered by the Claude Agent SDK",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 
 class QueryRequest(BaseModel):
     """Request model for /query endpoint."""
+    model_config = ConfigDict(extra="forbid", str_max_length=100_000)
+
     prompt: str
     system_prompt: str | None = None
     model: str | None = None
+    no_cache: bool = False
 
 
 class QueryResponse(BaseModel):
@@ -49,6 +111,42 @@ class QueryResponse(BaseModel):
     model: str
 
 
+class BatchQueryRequest(BaseModel):
+    """Request model for /batch_query endpoint."""
+    model_config = ConfigDict(extra="forbid", str_max_length=100_000)
+
+    prompts: list[str] = Field(min_length=1)
+    system_prompt: str | None = None
+    model: str | None = None
+    no_cache: bool = False
+
+    @field_validator("prompts")
+    @classmethod
+    def _cap_prompts(cls, prompts: list[str]) -> list[str]:
+        # The cap comes from settings, which are loaded after import
+        max_prompts = get_settings().batch_max_prompts
+        if len(prompts) > max_prompts:
+            raise ValueError(f"at most {max_prompts} prompts per batch")
+        return prompts
+
+
+class BatchQueryResponse(BaseModel):
+    """Response model for /batch_query endpoint."""
+    results: list[str]
+    model: str
+
+
+def _get_client(system_prompt: str | None, model: str | None) -> AgentClient:
+    """Return the shared client unless the request overrides it."""
+    if system_prompt is None and model is None:
+        return app.state.default_client
+
+    logger.debug("Initializing AgentClient...")
+    client = AgentClient(system_prompt=system_prompt, model=model)
+    logger.debug("AgentClient initialized")
+    return client
+
+
 @app.get("/health")
 async def health():
     """Health check endpoint for Render."""
@@ -58,31 +156,11 @@ async def health():
 @app.get("/debug/env")
 async def debug_env():
     """Debug endpoint to check env vars and CLI availability."""
-    import subprocess
-    import shutil
-
-    # Check if claude CLI is available
-    claude_path = shutil.which("claude")
-    node_path = shutil.which("node")
-    npm_path = shutil.which("npm")
-
-    # Try to get claude version
-    claude_version = None
-    try:
-        result = subprocess.run(["claude", "--version"], capture_output=True, text=True, timeout=10)
-        claude_version = result.stdout.strip() if result.returncode == 0 else f"error: {result.stderr}"
-    except Exception as e:
-        claude_version = f"exception: {str(e)}"
-
     return {
         "anthropic_key_present": "ANTHROPIC_API_KEY" in os.environ,
         "anthropic_key_length": len(os.environ.get("ANTHROPIC_API_KEY", "")),
         "port": os.environ.get("PORT", "not set"),
-        "claude_path": claude_path,
-        "claude_version": claude_version,
-        "node_path": node_path,
-        "npm_path": npm_path,
-    }
+    } | app.state.debug_env_cache
 
 
 @app.get("/")
@@ -106,53 +184,111 @@ async def query(request: QueryRequest):
     Returns:
         Agent response with result and model used
     """
-    import traceback
-
-    logger.info(f"Query received: {request.prompt[:50]}...")
+    logger.debug("Query received: %.50s...", request.prompt)
 
     try:
-        # Get settings for model info
-        logger.info("Loading settings...")
-        settings = get_settings()
-        logger.info(f"Settings loaded. Model: {settings.model}")
-
-        # Initialize client with optional overrides
-        logger.info("Initializing AgentClient...")
-        client = AgentClient(
-            system_prompt=request.system_prompt,
-            model=request.model,
-        )
-        logger.info("AgentClient initialized")
+        client = _get_client(request.system_prompt, request.model)
 
         # Execute query
-        logger.info("Executing query...")
-        result = await client.query(request.prompt)
-        logger.info(f"Query completed. Result length: {len(result)}")
+        result = await client.query(request.prompt, use_cache=not request.no_cache)
+        logger.debug("Query completed. Result length: %d", len(result))
 
         return QueryResponse(
             result=result,
-            model=request.model or settings.model,
+            model=client.model,
         )
 
     except ValueError as e:
-        # Configuration errors (missing API key, etc.)
-        logger.error(f"Configuration error: {e}")
-        logger.error(traceback.format_exc())
+        # Configuration errors
+        logger.exception("Configuration error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         # Unexpected errors
-        logger.error(f"Query failed: {type(e).__name__}: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Query failed: %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Query failed: {type(e).__name__}: {str(e)}")
 
 
-if __name__ == "__main__":
-    import uvicorn
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    """Stream a query's text blocks as server-sent events.
+
+    Args:
+        request: Query request with prompt and optional overrides
 
+    Returns:
+        An event stream of ``{"delta": ...}`` messages
+    """
+    logger.debug("Stream query received: %.50s...", request.prompt)
+
+    client = _get_client(request.system_prompt, request.model)
+
+    async def events():
+        try:
+            async with aclosing(client.stream(request.prompt)) as chunks:
+                async for chunk in chunks:
+                    yield b"data: " + orjson.dumps({"delta": chunk}) + b"\n\n"
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            logger.exception("Stream query failed")
+            yield b"data: " + orjson.dumps({"error": f"{type(e).__name__}: {e}"}) + b"\n\n"
+
+    return ClosingStreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/batch_query", response_model=BatchQueryResponse)
+async def batch_query(request: BatchQueryRequest):
+    """Execute several prompts concurrently against the Claude Agent.
+
+    Args:
+        request: Batch request with prompts and optional overrides
+
+    Returns:
+        Agent responses in prompt order with the model used
+    """
+    logger.debug("Batch query received: %d prompts", len(request.prompts))
+
+    try:
+        client = _get_client(request.system_prompt, request.model)
+        semaphore = app.state.batch_semaphore
+
+        async def run(prompt: str) -> str:
+            async with semaphore:
+                return await client.query(prompt, use_cache=not request.no_cache)
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tasks = [tg.create_task(run(prompt)) for prompt in request.prompts]
+        except ExceptionGroup as eg:
+            # The group has cancelled the remaining prompts; report the first failure
+            raise eg.exceptions[0] from None
+
+        results = [task.result() for task in tasks]
+        logger.debug("Batch query completed. Results: %d", len(results))
+
+        return BatchQueryResponse(
+            results=results,
+            model=client.model,
+        )
+
+    except ValueError as e:
+        # Configuration errors
+        logger.exception("Configuration error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        # Unexpected errors
+        logger.exception("Batch query failed: %s: %s", type(e).__name__, e)
+        raise HTTPException(status_code=500, detail=f"Batch query failed: {type(e).__name__}: {str(e)}")
+
+
+if __name__ == "__main__":
     settings = get_settings()
     uvicorn.run(
         "main:app",
         host=settings.host,
         port=settings.port,
-        reload=True,
+        workers=settings.workers,
+        # uvloop is not available on Windows
+        loop="uvloop" if sys.platform != "win32" else "asyncio",
+        http="httptools",
+        reload=False,
     )
@@ -1,6 +1,18 @@
 """Claude Agent service."""
 
-from .client import AgentClient
+from typing import TYPE_CHECKING
+
 from .config import get_settings
 
+if TYPE_CHECKING:
+    from .client import AgentClient
+
 __all__ = ["AgentClient", "get_settings"]
+
+
+def __getattr__(name: str):
+    # Import the client (and the Agent SDK behind it) on first use only
+    if name == "AgentClient":
+        from .client import AgentClient
+        return AgentClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,82 @@
+"""In-process response cache for agent queries."""
+
+import functools
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import xxhash
+
+from .config import get_settings
+
+
+class ResponseCache:
+    """LRU cache of agent responses with a per-entry TTL.
+
+    Entries are keyed on a namespace covering every option that shapes an
+    agent's answer plus the prompt, so responses never leak across client
+    configurations.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 600.0):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of responses kept before evicting
+            ttl: Seconds a response stays valid after it is stored
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    @staticmethod
+    def make_namespace(*options: object) -> str:
+        """Hash the options that shape a client's answers into a namespace.
+
+        Keys are only lookup handles, so a fast non-cryptographic hash is
+        used.
+        """
+        return xxhash.xxh3_128_hexdigest(repr(options).encode())
+
+    @staticmethod
+    def make_key(namespace: str, prompt: str) -> str:
+        """Build the cache key for a prompt within a namespace."""
+        return xxhash.xxh3_128_hexdigest(f"{namespace}\x00{prompt}".encode())
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, response = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return response
+
+    def set(self, key: str, response: str) -> None:
+        """Store a response, evicting the least recently used entries."""
+        self._entries[key] = (time.monotonic() + self.ttl, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached responses."""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@functools.cache
+def get_response_cache() -> ResponseCache:
+    """Get the shared response cache, creating it on first use."""
+    settings = get_settings()
+    return ResponseCache(
+        max_entries=settings.cache_max_entries,
+        ttl=settings.cache_ttl,
+    )
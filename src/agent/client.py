@@ -1,14 +1,32 @@
 """Claude Agent SDK client wrapper."""
 
 import logging
+from collections.abc import AsyncIterator, Sequence
+from contextlib import aclosing
 from typing import Optional
 
-from claude_agent_sdk import ClaudeSDKClient, ClaudeAgentOptions, AssistantMessage, TextBlock, ResultMessage
+from claude_agent_sdk import ClaudeSDKClient, ClaudeAgentOptions, AssistantMessage, Message, TextBlock, ResultMessage
 
+from .cache import ResponseCache, get_response_cache
 from .config import get_settings
 
 logger = logging.getLogger(__name__)
 
+# The Claude Code CLI marks the system prompt with an ephemeral
+# cache_control breakpoint, so keeping the default prompt as one stable
+# constant lets repeat queries hit the prompt cache.
+_DEFAULT_SYSTEM_PROMPT = """You are a helpful AI assistant powered by Claude.
+
+You can help with:
+- Answering questions
+- Analyzing information
+- Writing and reviewing content
+- Problem-solving
+
+Be concise, accurate, and helpful in your responses."""
+
+_DEFAULT_ALLOWED_TOOLS = ("Read", "Glob", "Grep")
+
 
 class AgentClient:
     """Wrapper around Claude Agent SDK using ClaudeSDKClient for session management."""
@@ -19,7 +37,7 @@ class AgentClient:
         model: Optional[str] = None,
         max_turns: Optional[int] = None,
         cwd: Optional[str] = None,
-        allowed_tools: Optional[list[str]] = None,
+        allowed_tools: Optional[Sequence[str]] = None,
     ):
         """Initialize agent client.
 
@@ -31,65 +49,109 @@ class AgentClient:
             allowed_tools: List of permitted tools
         """
         self._settings = get_settings()
-        self.system_prompt = system_prompt or self._default_system_prompt()
+        self._cache = get_response_cache()
+        self.system_prompt = system_prompt or _DEFAULT_SYSTEM_PROMPT
         self.model = model or self._settings.model
         self.max_turns = max_turns or 20
         self.cwd = cwd or "/tmp"
-        self.allowed_tools = allowed_tools or ["Read", "Glob", "Grep"]
-
-    def _default_system_prompt(self) -> str:
-        """Default system prompt for the agent."""
-        return """You are a helpful AI assistant powered by Claude.
-
-You can help with:
-- Answering questions
-- Analyzing information
-- Writing and reviewing content
-- Problem-solving
-
-Be concise, accurate, and helpful in your responses."""
+        self.allowed_tools = tuple(allowed_tools or _DEFAULT_ALLOWED_TOOLS)
+        self._options = self._build_options()
+        self._cache_namespace = ResponseCache.make_namespace(
+            self._options.system_prompt,
+            self._options.model,
+            self._options.max_turns,
+            self._options.cwd,
+            self._options.allowed_tools,
+            self._options.permission_mode,
+        )
+        self._handlers = {
+            AssistantMessage: self._handle_assistant,
+            ResultMessage: self._handle_result,
+        }
 
-    def _get_options(self) -> ClaudeAgentOptions:
-        """Build SDK options."""
+    def _build_options(self) -> ClaudeAgentOptions:
+        """Build SDK options once; they are fixed for the client's lifetime."""
         return ClaudeAgentOptions(
             system_prompt=self.system_prompt,
             model=self.model,
             max_turns=self.max_turns,
             cwd=self.cwd,
-            allowed_tools=self.allowed_tools,
+            allowed_tools=list(self.allowed_tools),
             permission_mode="acceptEdits",
         )
 
-    async def query(self, prompt: str) -> str:
+    async def query(self, prompt: str, use_cache: bool = True) -> str:
         """Execute a query and return the response using ClaudeSDKClient.
 
         Args:
             prompt: The user's query
+            use_cache: Serve a cached response for an identical recent query
+                from a client with the same configuration
 
         Returns:
             The agent's response as a string
         """
-        self._settings.validate_api_key()
-        logger.info(f"Processing query: {prompt[:100]}...")
+        cache_key = ResponseCache.make_key(self._cache_namespace, prompt)
+        if use_cache:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Serving cached response")
+                return cached
+
+        logger.debug("Processing query: %.100s...", prompt)
 
-        options = self._get_options()
         response_text = ""
 
-        async with ClaudeSDKClient(options=options) as client:
-            await client.query(prompt)
+        async with aclosing(self._receive(prompt)) as messages:
+            async for message in messages:
+                handler = self._handlers.get(type(message))
+                if handler:
+                    response_text = handler(message) or response_text
 
-            async for message in client.receive_response():
-                logger.debug(f"Received message type: {type(message).__name__}")
+        if not response_text:
+            return "No response generated."
+
+        self._cache.set(cache_key, response_text)
+        return response_text
+
+    @staticmethod
+    def _handle_assistant(message: AssistantMessage) -> Optional[str]:
+        """Return the last text block of an assistant message, if any."""
+        return next((block.text for block in reversed(message.content) if type(block) is TextBlock), None)
+
+    @staticmethod
+    def _handle_result(message: ResultMessage) -> Optional[str]:
+        """Return the final result of the session."""
+        return message.result
 
-                # Handle AssistantMessage with TextBlocks
-                if isinstance(message, AssistantMessage):
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Execute a query and yield text blocks as the agent produces them.
+
+        Streamed queries always run a fresh session and bypass the cache.
+
+        Args:
+            prompt: The user's query
+
+        Yields:
+            Each text block of the agent's replies, in order
+        """
+        logger.debug("Streaming query: %.100s...", prompt)
+
+        # Close the session as soon as the consumer stops, not at garbage collection
+        async with aclosing(self._receive(prompt)) as messages:
+            async for message in messages:
+                # Unlike query(), every text block is forwarded rather than just
+                # the last one, so the handler table does not apply here
+                if type(message) is AssistantMessage:
                     for block in message.content:
-                        if isinstance(block, TextBlock):
-                            response_text = block.text
+                        if type(block) is TextBlock:
+                            yield block.text
 
-                # Handle ResultMessage (final message with result)
-                elif isinstance(message, ResultMessage):
-                    if hasattr(message, 'result') and message.result:
-                        response_text = message.result
+    async def _receive(self, prompt: str) -> AsyncIterator[Message]:
+        """Run a prompt in a new ClaudeSDKClient session and yield its messages."""
+        async with ClaudeSDKClient(options=self._options) as client:
+            await client.query(prompt)
 
-        return response_text or "No response generated."
+            async for message in client.receive_response():
+                logger.debug("Received message type: %s", type(message).__name__)
+                yield message
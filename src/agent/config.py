@@ -1,11 +1,11 @@
 """Configuration management for Claude Agent service."""
 
+import functools
 import os
 from dataclasses import dataclass, field
-from typing import Optional
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Settings:
     """Application settings loaded from environment."""
 
@@ -18,13 +18,18 @@ class Settings:
     # Server Configuration
     port: int = field(default_factory=lambda: int(os.environ.get("PORT", "8080")))
     host: str = field(default_factory=lambda: os.environ.get("HOST", "0.0.0.0"))
+    workers: int = field(default_factory=lambda: int(os.environ.get("WEB_CONCURRENCY", "1")))
 
-    def validate_api_key(self):
-        """Validate API key is present. Call before making API requests."""
-        # Reload from env in case it wasn't available at init time
-        if not self.anthropic_api_key:
-            self.anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY", "")
+    # Response Cache Configuration
+    cache_ttl: float = field(default_factory=lambda: float(os.environ.get("CACHE_TTL_SECONDS", "600")))
+    cache_max_entries: int = field(default_factory=lambda: int(os.environ.get("CACHE_MAX_ENTRIES", "1024")))
+
+    # Batch Configuration
+    batch_concurrency: int = field(default_factory=lambda: int(os.environ.get("BATCH_CONCURRENCY", "8")))
+    batch_max_prompts: int = field(default_factory=lambda: int(os.environ.get("BATCH_MAX_PROMPTS", "64")))
 
+    def __post_init__(self):
+        """Fail fast at startup if the API key is missing."""
         if not self.anthropic_api_key:
             raise ValueError(
                 "ANTHROPIC_API_KEY not found. "
@@ -38,13 +43,7 @@ class Settings:
         return cls()
 
 
-# Singleton instance - lazy loaded
-_settings: Optional[Settings] = None
-
-
+@functools.cache
 def get_settings() -> Settings:
-    """Get or create settings instance."""
-    global _settings
-    if _settings is None:
-        _settings = Settings.load()
-    return _settings
+    """Get the settings instance, loading it on first use."""
+    return Settings.load()
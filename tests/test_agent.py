@@ -1,6 +1,45 @@
 """Basic tests for Claude Agent service."""
 
+import asyncio
+
 import pytest
+from claude_agent_sdk import AssistantMessage, ResultMessage, TextBlock, ToolUseBlock
+from fastapi.testclient import TestClient
+from starlette.requests import ClientDisconnect
+
+import main
+from agent.cache import ResponseCache, get_response_cache
+from agent.client import AgentClient
+from agent.config import Settings, get_settings
+
+
+@pytest.fixture
+def agent_env(monkeypatch):
+    """Load settings and the response cache from a test environment."""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-test")
+    get_settings.cache_clear()
+    get_response_cache.cache_clear()
+    yield
+    get_settings.cache_clear()
+    get_response_cache.cache_clear()
+
+
+@pytest.fixture
+def api(agent_env, monkeypatch):
+    """Test client for the service."""
+    # Skip forking the claude CLI at startup
+    monkeypatch.setattr(main, "_probe_cli", dict)
+    with TestClient(main.app) as client:
+        yield client
+
+
+async def _echo_receive(self, prompt):
+    """Stand-in for AgentClient._receive that answers with the upper-cased prompt."""
+    if prompt == "bad":
+        raise RuntimeError("boom")
+    if prompt == "slow":
+        await asyncio.sleep(0.05)
+    yield AssistantMessage(content=[TextBlock(text=prompt.upper())], model="test")
 
 
 def test_placeholder():
@@ -8,14 +47,260 @@ def test_placeholder():
     assert True
 
 
-# Uncomment when httpx is installed for integration tests
-# @pytest.mark.asyncio
-# async def test_health_endpoint():
-#     """Test health endpoint returns ok."""
-#     from httpx import AsyncClient
-#     from main import app
-#
-#     async with AsyncClient(app=app, base_url="http://test") as client:
-#         response = await client.get("/health")
-#         assert response.status_code == 200
-#         assert response.json() == {"status": "ok"}
+def test_settings_require_api_key(monkeypatch):
+    """Loading settings without an API key fails immediately."""
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+
+    with pytest.raises(ValueError, match="ANTHROPIC_API_KEY"):
+        Settings.load()
+
+
+def test_settings_load_from_env(monkeypatch):
+    """Settings pick up the API key from the environment."""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-test")
+
+    assert Settings.load().anthropic_api_key == "sk-ant-test"
+
+
+def _result_message(result):
+    return ResultMessage(
+        subtype="success",
+        duration_ms=1,
+        duration_api_ms=1,
+        is_error=False,
+        num_turns=1,
+        session_id="test",
+        result=result,
+    )
+
+
+def test_handle_assistant_returns_last_text_block():
+    """The last TextBlock wins, even when tool calls follow it."""
+    message = AssistantMessage(
+        content=[
+            TextBlock(text="first"),
+            ToolUseBlock(id="1", name="Read", input={}),
+            TextBlock(text="last"),
+            ToolUseBlock(id="2", name="Grep", input={}),
+        ],
+        model="test",
+    )
+
+    assert AgentClient._handle_assistant(message) == "last"
+
+
+def test_handle_assistant_without_text_returns_none():
+    """Assistant messages with only tool calls yield no text."""
+    message = AssistantMessage(content=[ToolUseBlock(id="1", name="Read", input={})], model="test")
+
+    assert AgentClient._handle_assistant(message) is None
+
+
+def test_query_keeps_earlier_text_when_result_is_empty(agent_env, monkeypatch):
+    """A ResultMessage without a result does not overwrite the assistant text."""
+
+    async def receive(self, prompt):
+        yield AssistantMessage(content=[TextBlock(text="answer")], model="test")
+        yield _result_message(None)
+
+    monkeypatch.setattr(AgentClient, "_receive", receive)
+
+    assert AgentClient._handle_result(_result_message(None)) is None
+    assert asyncio.run(AgentClient().query("hi", use_cache=False)) == "answer"
+
+
+def test_response_cache_roundtrip():
+    """Stored responses are returned for the same key."""
+    cache = ResponseCache()
+    key = ResponseCache.make_key(ResponseCache.make_namespace("system", "model"), "prompt")
+
+    assert cache.get(key) is None
+    cache.set(key, "answer")
+    assert cache.get(key) == "answer"
+
+
+def test_response_cache_key_is_namespaced():
+    """The same prompt under another persona or model gets its own key."""
+    key = ResponseCache.make_key(ResponseCache.make_namespace("system", "model"), "prompt")
+
+    assert key != ResponseCache.make_key(ResponseCache.make_namespace("other", "model"), "prompt")
+    assert key != ResponseCache.make_key(ResponseCache.make_namespace("system", "other"), "prompt")
+
+
+def test_query_cache_is_scoped_to_client_configuration(agent_env, monkeypatch):
+    """Clients that differ only in cwd do not share cached responses."""
+
+    async def receive(self, prompt):
+        yield AssistantMessage(content=[TextBlock(text=f"summary of {self.cwd}")], model="test")
+
+    monkeypatch.setattr(AgentClient, "_receive", receive)
+
+    async def run():
+        first = await AgentClient(cwd="/srv/repo-a").query("summarize the README")
+        second = await AgentClient(cwd="/srv/repo-b").query("summarize the README")
+        again = await AgentClient(cwd="/srv/repo-a").query("summarize the README")
+        return first, second, again
+
+    assert asyncio.run(run()) == ("summary of /srv/repo-a", "summary of /srv/repo-b", "summary of /srv/repo-a")
+    assert len(get_response_cache()) == 2
+
+
+def test_response_cache_expires_entries():
+    """Entries past their TTL are treated as misses."""
+    cache = ResponseCache(ttl=0)
+    cache.set("key", "answer")
+
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_response_cache_evicts_least_recently_used():
+    """The oldest untouched entry is evicted once the cache is full."""
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+
+
+def test_health_endpoint(api):
+    """Test health endpoint returns ok."""
+    response = api.get("/health")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_batch_query_returns_results_in_prompt_order(api, monkeypatch):
+    """Batch results line up with their prompts even when they finish out of order."""
+    monkeypatch.setattr(AgentClient, "_receive", _echo_receive)
+
+    response = api.post("/batch_query", json={"prompts": ["slow", "a", "b"], "no_cache": True})
+
+    assert response.status_code == 200
+    assert response.json()["results"] == ["SLOW", "A", "B"]
+
+
+def test_batch_query_rejects_empty_and_oversized_batches(api):
+    """Batches must hold between one and BATCH_MAX_PROMPTS prompts."""
+    max_prompts = get_settings().batch_max_prompts
+
+    assert api.post("/batch_query", json={"prompts": []}).status_code == 422
+    assert api.post("/batch_query", json={"prompts": ["a"] * (max_prompts + 1)}).status_code == 422
+
+
+def test_batch_query_failure_cancels_remaining_prompts(api, monkeypatch):
+    """One failing prompt fails the batch with its own error and cancels the rest."""
+    finished = []
+
+    async def receive(self, prompt):
+        if prompt == "bad":
+            raise RuntimeError("boom")
+        await asyncio.sleep(1)
+        finished.append(prompt)
+        yield AssistantMessage(content=[TextBlock(text=prompt)], model="test")
+
+    monkeypatch.setattr(AgentClient, "_receive", receive)
+
+    response = api.post("/batch_query", json={"prompts": ["slow", "bad"], "no_cache": True})
+
+    assert response.status_code == 500
+    assert response.json()["detail"] == "Batch query failed: RuntimeError: boom"
+    assert finished == []
+
+
+def test_query_stream_frames_deltas(api, monkeypatch):
+    """Each text block is sent as its own SSE data event."""
+
+    async def receive(self, prompt):
+        yield AssistantMessage(content=[TextBlock(text="hello "), TextBlock(text="world")], model="test")
+
+    monkeypatch.setattr(AgentClient, "_receive", receive)
+
+    response = api.post("/query/stream", json={"prompt": "hi"})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == 'data: {"delta":"hello "}\n\ndata: {"delta":"world"}\n\n'
+
+
+def test_query_stream_reports_errors_in_band(api, monkeypatch):
+    """A failure after the stream has started is sent as an error event."""
+    monkeypatch.setattr(AgentClient, "_receive", _echo_receive)
+
+    response = api.post("/query/stream", json={"prompt": "bad"})
+
+    assert response.status_code == 200
+    assert response.text == 'data: {"error":"RuntimeError: boom"}\n\n'
+
+
+def test_stream_closes_session_when_consumer_stops(agent_env, monkeypatch):
+    """Closing AgentClient.stream early tears the session down immediately."""
+    closed = []
+
+    async def receive(self, prompt):
+        try:
+            yield AssistantMessage(content=[TextBlock(text="one")], model="test")
+            yield AssistantMessage(content=[TextBlock(text="two")], model="test")
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(AgentClient, "_receive", receive)
+
+    async def consume_first():
+        chunks = AgentClient().stream("hi")
+        first = await anext(chunks)
+        await chunks.aclose()
+        return first
+
+    assert asyncio.run(consume_first()) == "one"
+    assert closed == [True]
+
+
+@pytest.mark.parametrize("spec_version", ["2.3", "2.4"])
+def test_closing_streaming_response_closes_body_on_disconnect(spec_version):
+    """The body generator is closed when the client disconnects.
+
+    ASGI 2.3 servers report the disconnect through receive() and Starlette
+    cancels the stream; under 2.4 the failed send() abandons the body, which
+    must then be closed in the request task.
+    """
+    closed_in = []
+    streaming = asyncio.Event()
+
+    async def body():
+        try:
+            yield b"one"
+            await asyncio.Event().wait()
+            yield b"two"
+        finally:
+            closed_in.append(asyncio.current_task())
+
+    async def receive():
+        await streaming.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            streaming.set()
+            if spec_version == "2.4":
+                raise OSError("client went away")
+
+    async def serve():
+        response = main.ClosingStreamingResponse(body())
+        scope = {"type": "http", "asgi": {"spec_version": spec_version}}
+        if spec_version == "2.4":
+            with pytest.raises(ClientDisconnect):
+                await response(scope, receive, send)
+        else:
+            await response(scope, receive, send)
+        return asyncio.current_task()
+
+    request_task = asyncio.run(serve())
+
+    assert len(closed_in) == 1
+    if spec_version == "2.4":
+        assert closed_in == [request_task]